@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Helper functions shared by the HDF5 readers
+
+@author: williamrigaut
+"""
+
+import h5py
+import math
+from contextlib import contextmanager
+
+# Raw-data chunk cache and file format bounds used for every file opened by the
+# readers: a 64 MiB cache holds several ~1 MiB chunks at once, and "latest" lets
+# HDF5 use its newer (faster) object-header layout when it is available. The slot
+# table is allocated for each opened chunked dataset, so it is kept small.
+FILE_OPTIONS = {
+    "libver": "latest",
+    "rdcc_nbytes": 64 * 1024 * 1024,
+    "rdcc_nslots": 10007,
+}
+
+
+@contextmanager
+def open_hdf5(hdf5_file, mode="r"):
+    """
+    Opens an HDF5 file, or reuses it if it is already open.
+
+    Parameters
+    ----------
+    hdf5_file : str, pathlib.Path or h5py.File
+        The path to the HDF5 file, or an already opened h5py.File object.
+    mode : str, default="r"
+        The mode used to open the file when a path is given.
+
+    Yields
+    ------
+    h5py.File
+        The opened HDF5 file. Files opened here are closed on exit, while an
+        already opened file is left open for the caller.
+    """
+    if isinstance(hdf5_file, h5py.File):
+        yield hdf5_file
+        return
+
+    with h5py.File(hdf5_file, mode, **FILE_OPTIONS) as h5f:
+        yield h5f
+
+
+def pick_chunks(shape, itemsize, target_bytes=1 << 20):
+    """
+    Computes a chunk shape for a dataset, close to a given size in bytes.
+
+    Parameters
+    ----------
+    shape : tuple of int
+        The shape of the dataset.
+    itemsize : int
+        The size in bytes of one element of the dataset.
+    target_bytes : int, default=1 MiB
+        The maximum size of one chunk.
+
+    Returns
+    -------
+    tuple of int
+        The chunk shape, obtained by halving the largest dimension until the chunk
+        is smaller than target_bytes.
+    """
+    chunks = list(shape)
+
+    while math.prod(chunks) * itemsize > target_bytes and max(chunks) > 1:
+        largest = chunks.index(max(chunks))
+        chunks[largest] = (chunks[largest] + 1) // 2
+
+    return tuple(chunks)
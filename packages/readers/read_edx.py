@@ -4,7 +4,7 @@ Functions to read EDX data from HDF5 files
 
 @author: williamrigaut
 """
-import h5py
+from packages.readers.hdf5_utils import open_hdf5
 
 
 def get_edx_composition(hdf5_file, group_path):
@@ -13,7 +13,7 @@ def get_edx_composition(hdf5_file, group_path):
 
     Parameters
     ----------
-    hdf5_file : str or Path
+    hdf5_file : str, pathlib.Path or h5py.File
         The path to the HDF5 file to read the data from.
     group_path : str or Path
         The path within the HDF5 file to the group containing the EDX data.
@@ -31,7 +31,7 @@ def get_edx_composition(hdf5_file, group_path):
     composition_units = {}
 
     try:
-        with h5py.File(hdf5_file, "r") as h5f:
+        with open_hdf5(hdf5_file) as h5f:
             # All the elements are stored in the results group
             elements = h5f[group_path].keys()
             for element in elements:
@@ -64,7 +64,7 @@ def get_edx_spectrum(hdf5_file, group_path):
 
     Parameters
     ----------
-    hdf5_file : str or pathlib.Path
+    hdf5_file : str, pathlib.Path or h5py.File
         The path to the HDF5 file to read the data from.
     group_path : str or pathlib.Path
         The path within the HDF5 file to the group containing the EDX spectrum data.
@@ -84,7 +84,7 @@ def get_edx_spectrum(hdf5_file, group_path):
     measurement = {}
     measurement_units = {}
     try:
-        with h5py.File(hdf5_file, "r") as h5f:
+        with open_hdf5(hdf5_file) as h5f:
             # Getting counts and energy datasets (with corresponding units)
             measurement["counts"] = h5f[group_path]["counts"][()]
             measurement["energy"] = h5f[group_path]["energy"][()]
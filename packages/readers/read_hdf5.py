@@ -6,77 +6,400 @@ HDF5 files for high-throughput experiment.
 @author: williamrigaut
 """
 
+import re
+import weakref
+import multiprocessing
+from collections import defaultdict
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
 import h5py
-import math
 import xarray as xr
 import numpy as np
+from packages.readers.hdf5_utils import FILE_OPTIONS, open_hdf5, pick_chunks
 from packages.readers.read_edx import get_edx_composition, get_edx_spectrum
 from packages.readers.read_moke import get_moke_results, get_moke_loop
 from packages.readers.read_xrd import get_xrd_results, get_xrd_pattern, get_xrd_image
 from tqdm import tqdm
 
+# Scan groups in MOKE data and alignement scans in ESRF data are not positions
+_SKIPPED_GROUPS = ["scan_parameters", "alignment_scans"]
+
+# HDF5 file opened in each worker process of the process pools
+_worker_h5f = None
+
+# Position groups of the file opened by a worker, indexed on its first Zarr write
+_worker_position_index = None
+
+# Names of the position groups, e.g. "(-5.0,10.0)"
+_POSITION_PATTERN = re.compile(r"\(([\-0-9.]+),([\-0-9.]+)\)")
+
+# Position groups of each opened file, see _get_position_groups
+_position_groups_cache = weakref.WeakKeyDictionary()
+
+# HT_type -> root group mapping of each opened file, see _get_data_type_groups
+_data_type_groups_cache = weakref.WeakKeyDictionary()
+
+# XRD phase results kept in the datasets, with the label used in get_full_dataset
+_XRD_FIELDS = (
+    ("phase_fraction", "Phase Fraction"),
+    ("A", "Lattice Parameter A"),
+    ("B", "Lattice Parameter B"),
+    ("C", "Lattice Parameter C"),
+)
+
+
+def _handle_cache(cache, h5f, factory):
+    """
+    Returns a value cached for an opened HDF5 file, creating it if needed.
+
+    Parameters
+    ----------
+    cache : weakref.WeakKeyDictionary
+        The cache, with the h5py.File objects as keys.
+    h5f : h5py.File
+        The opened HDF5 file.
+    factory : callable
+        The function called without arguments to create the value.
+
+    Returns
+    -------
+    Any
+        The cached value, or a new value if the file is not in the cache.
+
+    Notes
+    -----
+    Only the files opened in read-only mode are cached, the value is created again
+    on every call for files opened for writing, as their groups can change.
+    """
+    file_id, value = cache.get(h5f, (None, None))
+    # The same file opened twice gives equal h5py.File objects with different ids
+    if file_id is h5f.id:
+        return value
+
+    value = factory()
+    if h5f.mode == "r":
+        cache[h5f] = (h5f.id, value)
+
+    return value
+
+
+def _get_data_type_groups(h5f):
+    """
+    Returns the mapping between HT_type and root group names of an opened HDF5 file.
+
+    Parameters
+    ----------
+    h5f : h5py.File
+        The opened HDF5 file.
+
+    Returns
+    -------
+    dict
+        A dictionary with the HT_type as keys and the root group paths as values.
+
+    Notes
+    -----
+    The mapping is cached for files opened in read-only mode, see _handle_cache.
+    """
+
+    def build_data_type_groups():
+        data_type_groups = {}
+        for name, group in h5f.items():
+            data_type = group.attrs.get("HT_type")
+            if data_type is not None:
+                data_type_groups.setdefault(data_type, f"./{name}")
+        return data_type_groups
+
+    return _handle_cache(_data_type_groups_cache, h5f, build_data_type_groups)
+
+
+def _parse_scalar_bytes(value):
+    """
+    Converts a value read from the XRD results into a float.
+
+    Parameters
+    ----------
+    value : bytes, str or float
+        The raw value read from the HDF5 file, strings are formatted as "value+-error".
+
+    Returns
+    -------
+    float
+        The value without its error, NaN if the value is undefined.
+    """
+    if isinstance(value, str):
+        value = value.encode()
+    if not isinstance(value, bytes):
+        return float(value)
+
+    head = value.partition(b"+-")[0].strip(b"b'\" ")
+    if b"UNDEF" in head:
+        return np.nan
+
+    return float(head)
+
+
+def _parse_scalar_bytes_array(values):
+    """
+    Converts many values read from the XRD results into floats at once.
+
+    Parameters
+    ----------
+    values : list
+        The raw values read from the HDF5 file, see _parse_scalar_bytes.
+
+    Returns
+    -------
+    numpy.ndarray
+        The values without their errors, NaN where the value is undefined.
+    """
+    if not all(isinstance(value, bytes) for value in values):
+        return np.array([_parse_scalar_bytes(value) for value in values], dtype=float)
+
+    heads = np.char.strip(np.char.partition(np.array(values), b"+-")[:, 0], b"b'\" ")
+    heads[np.char.find(heads, b"UNDEF") >= 0] = b"nan"
+
+    return heads.astype(float)
+
+
+def _position_key(x_pos, y_pos):
+    """
+    Returns the key of a position in the position groups dictionary.
+
+    Parameters
+    ----------
+    x_pos : float or str
+        The x position.
+    y_pos : float or str
+        The y position.
+
+    Returns
+    -------
+    tuple of int
+        The x and y positions in integer tenths, which avoids float keys.
+    """
+    return int(np.round(float(x_pos) * 10)), int(np.round(float(y_pos) * 10))
+
+
+def _get_position_groups(h5f, data_type):
+    """
+    Returns the position groups of a data type, indexed by their position.
+
+    Parameters
+    ----------
+    h5f : h5py.File
+        The opened HDF5 file.
+    data_type : str
+        The type of data, either 'EDX', 'MOKE' or 'XRD'.
+
+    Returns
+    -------
+    dict
+        A dictionary with the position keys (see _position_key) as keys and the
+        h5py.Group of each position as values.
+
+    Notes
+    -----
+    The dictionary is built by parsing the "(x,y)" names of the groups, once per
+    data type for files opened in read-only mode (see _handle_cache).
+    """
+    position_groups = _handle_cache(_position_groups_cache, h5f, dict)
+
+    if data_type.lower() not in position_groups:
+        data_group = h5f[make_group_path(h5f, data_type=data_type)]
+        groups = {}
+        for name, group in data_group.items():
+            match = _POSITION_PATTERN.fullmatch(name)
+            if match is not None:
+                groups[_position_key(*match.groups())] = group
+        position_groups[data_type.lower()] = groups
+
+    return position_groups[data_type.lower()]
+
 
 def make_group_path(
     hdf5_file, data_type, measurement_type=None, x_pos=None, y_pos=None
 ):
 
-    with h5py.File(hdf5_file, "r") as h5f:
+    with open_hdf5(hdf5_file) as h5f:
         # Check which group corresponds to the data type
-        start_group = None
-        for group in h5f["./"]:
-            if h5f[f"./{group}"].attrs["HT_type"] == data_type.lower():
-                start_group = f"./{group}"
-                break
+        start_group = _get_data_type_groups(h5f).get(data_type.lower())
         if start_group is None:
             raise ValueError(f"Data type {data_type} not found in HDF5 file.")
 
         if measurement_type is None or x_pos is None or y_pos is None:
             return start_group
 
-        # Getting the corresponding measurement path
-        x_pos = str(round(float(x_pos), 1))
-        y_pos = str(round(float(y_pos), 1))
-        group = f"({x_pos},{y_pos})"
-        instrument = h5f[f"{start_group}/{group}"][measurement_type.lower()]
-        group_path = f"{start_group}/{group}/{measurement_type.lower()}"
+        # Getting the corresponding measurement path, the position groups are only
+        # indexed when the file is kept open by the caller in read-only mode, as
+        # the index of a writable file would be rebuilt on every lookup
+        if isinstance(hdf5_file, h5py.File) and h5f.mode == "r":
+            group = _get_position_groups(h5f, data_type).get(
+                _position_key(x_pos, y_pos)
+            )
+        else:
+            # Adding 0.0 turns -0.0 into 0.0, as in the group names
+            x_round, y_round = np.round([float(x_pos), float(y_pos)], 1) + 0.0
+            group = h5f[start_group].get(f"({float(x_round)},{float(y_round)})")
+        if group is None:
+            raise KeyError(f"Position ({x_pos},{y_pos}) not found in {data_type} data.")
+        if measurement_type.lower() not in group:
+            raise KeyError(f"{measurement_type} not found in {group.name}.")
+        group_path = f"{group.name}/{measurement_type.lower()}"
 
     return group_path
 
 
-def get_all_positions(hdf5_file, data_type: str):
+def _read_position(instrument, out):
+    """
+    Reads the x and y positions of an instrument group into a NumPy array.
+
+    Parameters
+    ----------
+    instrument : h5py.Group
+        The instrument group containing the 'x_pos' and 'y_pos' datasets.
+    out : numpy.ndarray
+        A contiguous float array of size 2 where the x and y positions are written.
+
+    Notes
+    -----
+    The one-element numeric datasets are read with the low-level h5py API, which
+    avoids most of the overhead of the high-level indexing. Other types (e.g.
+    positions stored as strings) are read and converted with float().
+    """
+    for i, name in enumerate([b"x_pos", b"y_pos"]):
+        dataset = h5py.h5d.open(instrument.id, name)
+        if dataset.get_type().get_class() in (h5py.h5t.INTEGER, h5py.h5t.FLOAT):
+            dataset.read(h5py.h5s.ALL, h5py.h5s.ALL, out[i : i + 1])
+        else:
+            out[i] = float(instrument[name.decode()][()])
+
+
+def _iter_position_groups(h5f, data_type: str):
+    """
+    Iterates over all the position groups of a data type in an opened HDF5 file.
+
+    Parameters
+    ----------
+    h5f : h5py.File
+        The opened HDF5 file.
+    data_type : str
+        The type of data to iterate over, either 'EDX', 'MOKE' or 'XRD'.
+
+    Yields
+    ------
+    tuple
+        The x position, the y position and the h5py.Group of each position.
+    """
+    data_group = make_group_path(h5f, data_type=data_type)
+
+    for name, group in h5f[data_group].items():
+        if name in _SKIPPED_GROUPS:
+            continue
+
+        position = np.empty(2, dtype=np.float64)
+        _read_position(group["instrument"], position)
+        # Rounded like in get_all_positions, so that both give the same grid
+        x, y = (float(value) for value in np.round(position, 1))
+        yield x, y, group
+
+
+def _remove_wafer_edges(positions, max_distance, strict=True):
+    """
+    Removes the positions at the edges of the wafer.
+
+    Parameters
+    ----------
+    positions : list of tuples
+        The positions, each tuple starting with the x and y positions.
+    max_distance : float
+        The limit of |x| + |y| beyond which a position is on the edge of the wafer.
+    strict : bool, default=True
+        If True, the positions at exactly max_distance are removed too.
+
+    Returns
+    -------
+    list of tuples
+        The positions that are not on the edges of the wafer.
+    """
+    if len(positions) == 0:
+        return positions
+
+    # Distance of all the positions computed at once
+    coords = np.array([position[:2] for position in positions], dtype=np.float64)
+    distances = np.abs(coords).sum(axis=1)
+    keep = distances < max_distance if strict else distances <= max_distance
+
+    return [position for position, kept in zip(positions, keep) if kept]
+
+
+def _read_position_units(instrument):
+    """
+    Reads the units of the x and y positions of an instrument group.
+
+    Parameters
+    ----------
+    instrument : h5py.Group
+        The instrument group of a position, containing the x_pos and y_pos datasets.
+
+    Returns
+    -------
+    dict
+        A dictionary containing the units for the x and y positions.
+    """
+    return {
+        "x_pos": instrument["x_pos"].attrs["units"],
+        "y_pos": instrument["y_pos"].attrs["units"],
+    }
+
+
+def get_all_positions(hdf5_file, data_type: str, return_units=False):
     """
     Retrieves all unique positions and associated scan numbers from an HDF5 file.
 
     Parameters
     ----------
-    hdf5_file : str or pathlib.Path
+    hdf5_file : str, pathlib.Path or h5py.File
         The path to the HDF5 file to read the data from.
     data_type : str
         The type of data to retrieve positions for, corresponds to a subgroup under 'entry'.
+    return_units : bool, default=False
+        If True, the units of the x and y positions are returned too, read from the
+        (0.0,0.0) position (or the first position if there is none at the center).
 
     Returns
     -------
     list of tuples
-        A sorted list of unique tuples, each containing the x position, y position, and scan number.
+        A sorted list of unique tuples, each containing the x position and y position.
+    dict
+        A dictionary containing the units for the x and y positions, only returned
+        if return_units is True.
     """
+    position_units = None
 
-    positions = []
+    with open_hdf5(hdf5_file) as h5f:
+        data_group = make_group_path(h5f, data_type=data_type)
+        groups = [
+            (name, group)
+            for name, group in h5f[data_group].items()
+            if name not in _SKIPPED_GROUPS
+        ]
 
-    data_group = make_group_path(hdf5_file, data_type=data_type)
+        positions = np.empty((len(groups), 2), dtype=np.float64)
+        for i, (name, group) in enumerate(groups):
+            instrument = group["instrument"]
+            _read_position(instrument, positions[i])
+            if return_units and (position_units is None or name == "(0.0,0.0)"):
+                position_units = _read_position_units(instrument)
 
-    with h5py.File(hdf5_file, "r") as h5f:
-        for group in h5f[data_group]:
-            # Skipping scan groupes in MOKE data and alignement scans in ESRF data
-            if group in ["scan_parameters", "alignment_scans"]:
-                continue
+    # Rounding and sorting all the unique positions at once
+    positions = np.unique(np.round(positions, 1), axis=0)
+    positions = [(float(x), float(y)) for x, y in positions]
 
-            # print(h5f[f"{data_group}/{group}/"])
-            instrument = h5f[f"{data_group}/{group}/instrument"]
-            x = round(float(instrument["x_pos"][()]), 1)
-            y = round(float(instrument["y_pos"][()]), 1)
-            positions.append((x, y))
+    if return_units:
+        return positions, position_units
 
-    return sorted(set(positions))
+    return positions
 
 
 def get_position_units(hdf5_file, data_type: str):
@@ -85,7 +408,7 @@ def get_position_units(hdf5_file, data_type: str):
 
     Parameters
     ----------
-    hdf5_file : str or pathlib.Path
+    hdf5_file : str, pathlib.Path or h5py.File
         The path to the HDF5 file to read the data from.
     data_type : str
         The type of data to read, either 'EDX', 'MOKE' or 'XRD'.
@@ -95,172 +418,144 @@ def get_position_units(hdf5_file, data_type: str):
     dict
         A dictionary containing the units for the x and y positions.
     """
-    position_units = {}
-
-    root_group = make_group_path(hdf5_file, data_type=data_type)
-
-    with h5py.File(hdf5_file, "r") as h5f:
-        instrument = h5f[f"{root_group}"]["(0.0,0.0)"]["instrument"]
-        position_units["x_pos"] = instrument["x_pos"].attrs["units"]
-        position_units["y_pos"] = instrument["y_pos"].attrs["units"]
+    with open_hdf5(hdf5_file) as h5f:
+        root_group = make_group_path(h5f, data_type=data_type)
+        instrument = h5f[root_group]["(0.0,0.0)"]["instrument"]
+        position_units = _read_position_units(instrument)
 
     return position_units
 
 
-def get_full_dataset(hdf5_file, exclude_wafer_edges=True):
+def get_full_dataset(hdf5_file, exclude_wafer_edges=True, dtype=np.float32):
     """
     Construct the xarray Dataset with composition, coercivity, and lattice parameter.
 
     Parameters
     ----------
-    hdf5_file : str or pathlib.Path
+    hdf5_file : str, pathlib.Path or h5py.File
         The path to the HDF5 file to read the data from.
     exclude_wafer_edges : bool, default=True
         If True, exclude the positions at the edges of the wafer (i.e. at x=+/-40 and y=+/-40).
+    dtype : numpy.dtype, default=numpy.float32
+        The dtype of the data variables. Single precision is enough for the measured
+        values, use numpy.float64 to keep the full precision of the file.
 
     Returns
     -------
     data : xarray.Dataset
         An xarray Dataset containing the composition, coercivity and lattice parameters of the samples at each position.
     """
-    # Looking for EDX positions and scan numbers
-    positions = get_all_positions(hdf5_file, data_type="EDX")
-    position_units = get_position_units(hdf5_file, data_type="EDX")
-
-    x_vals = sorted(set([pos[0] for pos in positions]))
-    y_vals = sorted(set([pos[1] for pos in positions]))
-
-    data = xr.Dataset()
-
-    # Retrieve EDX composition
-    for x, y in positions:
-        if np.abs(x) + np.abs(y) >= 60 and exclude_wafer_edges:
-            continue
-
-        edx_group_path = make_group_path(
-            hdf5_file, x_pos=x, y_pos=y, data_type="EDX", measurement_type="Results"
-        )
-        composition, composition_units = get_edx_composition(hdf5_file, edx_group_path)
-
-        for element in composition:
-            elm_keys = composition[element].keys()
-            element_key = f"{element} Composition"
-            if "AtomPercent" not in elm_keys:
-                value = np.nan
-            else:
-                value = composition[element]["AtomPercent"]
-
-            if element_key not in data and not math.isnan(value):
-                data[element_key] = xr.DataArray(
-                    np.nan, coords=[y_vals, x_vals], dims=["y", "x"]
-                )
-            if element_key in data:
-                data[element_key].loc[{"y": y, "x": x}] = value
+    with open_hdf5(hdf5_file) as h5f:
+        # Looking for EDX positions, they define the grid of the dataset
+        edx_groups = list(_iter_position_groups(h5f, data_type="EDX"))
+        position_units = None
+        for x, y, group in edx_groups:
+            if position_units is None or (x, y) == (0.0, 0.0):
+                position_units = _read_position_units(group["instrument"])
+
+        x_vals = sorted(set([x for x, _, _ in edx_groups]))
+        y_vals = sorted(set([y for _, y, _ in edx_groups]))
+        x_index = {x: i for i, x in enumerate(x_vals)}
+        y_index = {y: i for i, y in enumerate(y_vals)}
+
+        # Values are gathered in NumPy arrays, then converted to xarray once at the end
+        def empty_map():
+            return np.full((len(y_vals), len(x_vals)), np.nan, dtype=dtype)
+
+        values = defaultdict(empty_map)
+        units = {}
+
+        # Retrieve EDX composition
+        if exclude_wafer_edges:
+            edx_groups = _remove_wafer_edges(edx_groups, max_distance=60)
+
+        for x, y, group in edx_groups:
+
+            composition, composition_units = get_edx_composition(
+                h5f, f"{group.name}/results"
+            )
 
-            # Getting the composition units in the xarray
-            if "AtomPercent" in composition_units[element].keys():
-                data[element_key].attrs["units"] = composition_units[element][
-                    "AtomPercent"
-                ]
+            for element in composition:
+                elm_keys = composition[element].keys()
+                element_key = f"{element} Composition"
+                if "AtomPercent" not in elm_keys:
+                    value = np.nan
+                else:
+                    value = composition[element]["AtomPercent"]
 
-    # Looking for MOKE positions and scan numbers
-    positions = get_all_positions(hdf5_file, data_type="MOKE")
+                values[element_key][y_index[y], x_index[x]] = value
 
-    # Retrieve Coercivity (from MOKE results)
-    for x, y in positions:
-        if np.abs(x) + np.abs(y) >= 60 and exclude_wafer_edges:
-            continue
-        moke_group_path = make_group_path(
-            hdf5_file, x_pos=x, y_pos=y, data_type="MOKE", measurement_type="Results"
-        )
-        moke_value, moke_units = get_moke_results(
-            hdf5_file, moke_group_path, result_type=None
-        )
-        for value in moke_value:
-            if value not in data:
-                data[value] = xr.DataArray(
-                    np.nan, coords=[y_vals, x_vals], dims=["y", "x"]
-                )
-        # Setting the values for moke in the xarray with the units
-        for value in moke_value:
-            data[value].loc[{"y": y, "x": x}] = moke_value[value]
-            data[value].attrs["units"] = moke_units[value]
+                # Getting the composition units, they are the same for every position
+                if "AtomPercent" in composition_units[element].keys():
+                    units.setdefault(
+                        element_key, composition_units[element]["AtomPercent"]
+                    )
 
-    # Looking for XRD positions and scan numbers
-    positions = get_all_positions(hdf5_file, data_type="XRD")
+        # Retrieve Coercivity (from MOKE results)
+        moke_groups = list(_iter_position_groups(h5f, data_type="MOKE"))
+        if exclude_wafer_edges:
+            moke_groups = _remove_wafer_edges(moke_groups, max_distance=60)
 
-    # Retrieve Lattice Parameter (from XRD results)
-    for x, y in positions:
-        if np.abs(x) + np.abs(y) >= 60 and exclude_wafer_edges:
-            continue
-        xrd_group_path = make_group_path(
-            hdf5_file, x_pos=x, y_pos=y, data_type="XRD", measurement_type="Results"
-        )
-        xrd_phases, xrd_units = get_xrd_results(
-            hdf5_file, xrd_group_path, result_type="Phases"
-        )
+        for x, y, group in moke_groups:
+            moke_value, moke_units = get_moke_results(
+                h5f, f"{group.name}/results", result_type=None
+            )
+            # Setting the values for moke in the xarray with the units
+            for value in moke_value:
+                values[value][y_index[y], x_index[x]] = moke_value[value]
+                units.setdefault(value, moke_units[value])
+
+        # Retrieve Lattice Parameter (from XRD results)
+        xrd_groups = list(_iter_position_groups(h5f, data_type="XRD"))
+        if exclude_wafer_edges:
+            xrd_groups = _remove_wafer_edges(xrd_groups, max_distance=60)
+
+        # The raw values are parsed in one batch per label once all are read
+        raw_values = defaultdict(list)
+        raw_indices = defaultdict(list)
+        for x, y, group in xrd_groups:
+            xrd_phases, xrd_units = get_xrd_results(
+                h5f, f"{group.name}/results", result_type="Phases"
+            )
 
-        # Looking for the lattice parameters among all the phases attributs
-        for phase in xrd_phases.keys():
-            phase_fraction = np.nan
-            lattice_a = np.nan
-            lattice_b = np.nan
-            lattice_c = np.nan
-
-            phase_fraction_label = f"{phase} Phase Fraction"
-            lattice_a_label = f"{phase} Lattice Parameter A"
-            lattice_b_label = f"{phase} Lattice Parameter B"
-            lattice_c_label = f"{phase} Lattice Parameter C"
-            phase_keys = xrd_phases[phase].keys()
-
-            if "phase_fraction" in phase_keys:
-                phase_fraction = str(xrd_phases[phase]["phase_fraction"])
-                if not "UNDEF'" in phase_fraction:
-                    phase_fraction = phase_fraction.split("+-")[0].replace("b'", "")
-                    phase_fraction = float(phase_fraction)
-            if "A" in phase_keys:
-                a_str = str(xrd_phases[phase]["A"])
-                if not "UNDEF'" in a_str:
-                    lattice_a = a_str.split("+-")[0].replace("b'", "")
-                    lattice_a = float(lattice_a)
-            if "B" in phase_keys:
-                b_str = str(xrd_phases[phase]["B"])
-                if not "UNDEF'" in b_str:
-                    lattice_b = b_str.split("+-")[0].replace("b'", "")
-                    lattice_b = float(lattice_b)
-            if "C" in phase_keys:
-                c_str = str(xrd_phases[phase]["C"])
-                if not "UNDEF'" in c_str:
-                    lattice_c = c_str.split("+-")[0].replace("b'", "").replace("'", "")
-                    lattice_c = float(lattice_c)
-
-            # Adding all the lattice parameters to the dataset
-            lattice_labels = [
-                phase_fraction_label,
-                lattice_a_label,
-                lattice_b_label,
-                lattice_c_label,
-            ]
-            lattice_values = [phase_fraction, lattice_a, lattice_b, lattice_c]
-
-            for i in range(len(lattice_labels)):
-                # Test if all lattice values are not np.nan (if there is no B values we do not create the corresponding array)
-                if lattice_labels[i] not in data and not math.isnan(lattice_values[i]):
-                    data[lattice_labels[i]] = xr.DataArray(
-                        np.nan, coords=[y_vals, x_vals], dims=["y", "x"]
-                    )
-                if lattice_labels[i] in data:
-                    data[lattice_labels[i]].loc[{"y": y, "x": x}] = lattice_values[i]
+            # Looking for the lattice parameters among all the phases attributs
+            for phase in xrd_phases.keys():
+                phase_keys = xrd_phases[phase].keys()
+
+                for key, field in _XRD_FIELDS:
+                    label = f"{phase} {field}"
+                    # Missing values stay NaN, the array is still created to keep
+                    # the order of the variables
+                    if label not in values:
+                        values[label] = empty_map()
+                    if key not in phase_keys:
+                        continue
 
-    # Getting the lattice units in the xarray
-    for phase in xrd_phases.keys():
-        for i, elm in enumerate(["phase_fraction", "A", "B", "C"]):
-            if elm in phase_keys and elm in xrd_units[phase]:
-                data[lattice_labels[i]].attrs["units"] = xrd_units[phase][elm]
+                    raw_values[label].append(xrd_phases[phase][key])
+                    raw_indices[label].append((y_index[y], x_index[x]))
+                    # Getting the lattice units of the current phase
+                    if key in xrd_units[phase]:
+                        units.setdefault(label, xrd_units[phase][key])
+
+        for label, raw in raw_values.items():
+            rows, cols = zip(*raw_indices[label])
+            values[label][rows, cols] = _parse_scalar_bytes_array(raw)
+
+        # Building the xarray Dataset from the filled arrays
+        data = xr.Dataset()
+        for key in values:
+            # Arrays without any value are not added (e.g. if there is no B values for a phase)
+            if np.isnan(values[key]).all():
+                continue
+            data[key] = xr.DataArray(
+                values[key], coords=[y_vals, x_vals], dims=["y", "x"]
+            )
+            if key in units:
+                data[key].attrs["units"] = units[key]
 
-    # Setting the units for x_pos and y_pos
-    data["x"].attrs["units"] = position_units["x_pos"]
-    data["y"].attrs["units"] = position_units["y_pos"]
+        # Setting the units for x_pos and y_pos
+        data["x"].attrs["units"] = position_units["x_pos"]
+        data["y"].attrs["units"] = position_units["y_pos"]
 
     return data
 
@@ -271,7 +566,7 @@ def search_measurement_data_from_type(hdf5_file, data_type, x_pos, y_pos):
 
     Parameters
     ----------
-    hdf5_file : str
+    hdf5_file : str or h5py.File
         Path to the HDF5 file
     data_type : str
         Type of measurement data to search for. Can be "EDX", "MOKE" or "XRD".
@@ -291,107 +586,71 @@ def search_measurement_data_from_type(hdf5_file, data_type, x_pos, y_pos):
     "<data_type>/<nb_scan>/Measurement". For MOKE, the group path is "<data_type>/<nb_scan>/Results".
     """
 
-    if data_type.lower() == "edx":
-        group_path = make_group_path(
-            hdf5_file,
-            data_type="EDX",
-            measurement_type="Measurement",
-            x_pos=x_pos,
-            y_pos=y_pos,
-        )
-        data, data_units = get_edx_spectrum(hdf5_file, group_path)
-    elif data_type.lower() == "moke":
-        group_path = make_group_path(
-            hdf5_file,
-            data_type="MOKE",
-            measurement_type="Measurement",
-            x_pos=x_pos,
-            y_pos=y_pos,
-        )
-        data, data_units = get_moke_loop(hdf5_file, group_path)
-    elif data_type.lower() == "xrd":
-        group_path = make_group_path(
-            hdf5_file,
-            data_type="XRD",
-            measurement_type="Measurement",
-            x_pos=x_pos,
-            y_pos=y_pos,
-        )
-        data, data_units = get_xrd_pattern(hdf5_file, group_path)
+    with open_hdf5(hdf5_file) as h5f:
+        if data_type.lower() == "edx":
+            group_path = make_group_path(
+                h5f,
+                data_type="EDX",
+                measurement_type="Measurement",
+                x_pos=x_pos,
+                y_pos=y_pos,
+            )
+            data, data_units = get_edx_spectrum(h5f, group_path)
+        elif data_type.lower() == "moke":
+            group_path = make_group_path(
+                h5f,
+                data_type="MOKE",
+                measurement_type="Measurement",
+                x_pos=x_pos,
+                y_pos=y_pos,
+            )
+            data, data_units = get_moke_loop(h5f, group_path)
+        elif data_type.lower() == "xrd":
+            group_path = make_group_path(
+                h5f,
+                data_type="XRD",
+                measurement_type="Measurement",
+                x_pos=x_pos,
+                y_pos=y_pos,
+            )
+            data, data_units = get_xrd_pattern(h5f, group_path)
 
     return data, data_units
 
 
-def add_measurement_data(dataset, measurement, data_type, x, y, x_vals, y_vals):
+def add_measurement_data(measurement_arrays, measurement, x, y, x_index, y_index):
     """
-    Add measurement data to the given dataset.
+    Add measurement data to the arrays of the given data type.
 
     Parameters
     ----------
-    dataset : xarray.Dataset
-        The dataset to which the measurement data should be added.
+    measurement_arrays : dict
+        A dictionary with the measurement keys as keys and, as values, a tuple with the
+        scan axis values and the NumPy array holding the data of every position.
     measurement : dict
         A dictionary containing the measurement data.
-    data_type : str
-        The type of the measurement data (e.g. "edx", "moke", "xrd").
-    x : int
+    x : float
         The x position of the measurement.
-    y : int
+    y : float
         The y position of the measurement.
-    x_vals : list
-        A list of all x values in the dataset.
-    y_vals : list
-        A list of all y values in the dataset.
+    x_index : dict
+        A dictionary giving the index of each x value in the arrays.
+    y_index : dict
+        A dictionary giving the index of each y value in the arrays.
 
     Returns
     -------
     None
     """
     for key in measurement.keys():
-        if key not in dataset:
-            dataset[key] = xr.DataArray(
-                np.nan, coords=[y_vals, x_vals, measurement[key]], dims=["y", "x", key]
+        if key not in measurement_arrays:
+            # The first measurement read gives the values of the scan axis
+            measurement_arrays[key] = (
+                measurement[key],
+                np.full((len(y_index), len(x_index), len(measurement[key])), np.nan),
             )
 
-        dataset[key].loc[{"y": y, "x": x}] = measurement[key]
-
-    # if data_type.lower() == "edx":
-    #     # Generate a new DataArray the first time a new data type is encountered
-    #     if "counts" not in dataset:
-    #         dataset["counts"] = xr.DataArray(
-    #             np.nan,
-    #             coords=[y_vals, x_vals, measurement["energy"]],
-    #             dims=["y", "x", "energy"],
-    #         )
-    #     # Add the measurement data point to the existing DataArray
-    #     dataset["counts"].loc[{"y": y, "x": x, "energy": measurement["energy"]}] = (
-    #         measurement["counts"]
-    #     )
-
-    # if data_type.lower() == "moke":
-    # if "Loops" not in dataset:
-    #     dataset["Loops"] = xr.DataArray(
-    #         np.nan,
-    #         coords=[y_vals, x_vals, ["magnetization", "applied field"], n_indexes],
-    #         dims=["y", "x", "index_value", "n_indexes"],
-    #     )
-    # dataset["Loops"].loc[
-    #     {"y": y, "x": x, "index_value": "magnetization", "n_indexes": n_indexes}
-    # ] = measurement["magnetization"]
-    # dataset["Loops"].loc[
-    #     {"y": y, "x": x, "index_value": "applied field", "n_indexes": n_indexes}
-    # ] = measurement["applied field"]
-
-    # if data_type.lower() == "xrd":
-    #     if "counts" not in dataset:
-    #         dataset["counts"] = xr.DataArray(
-    #             np.nan,
-    #             coords=[y_vals, x_vals, measurement["angle"]],
-    #             dims=["y", "x", "angle"],
-    #         )
-    #     dataset["counts"].loc[{"y": y, "x": x, "angle": measurement["angle"]}] = (
-    #         measurement["counts"]
-    #     )
+        measurement_arrays[key][1][y_index[y], x_index[x]] = measurement[key]
 
     return None
 
@@ -426,18 +685,136 @@ def get_current_dataset(data_type, dataset_edx, dataset_moke, dataset_xrd):
     return current_dataset
 
 
-def get_measurement_data(hdf5_file, data_type, exclude_wafer_edges=True):
+def _init_worker(hdf5_path):
+    """
+    Opens the HDF5 file once in each worker process of a process pool.
+
+    Parameters
+    ----------
+    hdf5_path : str or pathlib.Path
+        The path to the HDF5 file to read the data from.
+    """
+    global _worker_h5f
+
+    # File locking is disabled since several processes read the same file
+    _worker_h5f = h5py.File(hdf5_path, "r", locking=False, **FILE_OPTIONS)
+
+
+def _reading_pool(h5f, max_workers=None):
+    """
+    Creates a process pool where each worker opens the given HDF5 file.
+
+    Parameters
+    ----------
+    h5f : h5py.File
+        The opened HDF5 file, the workers open it again from its filename.
+    max_workers : int, optional
+        The number of processes in the pool. If None or 1, no pool is created.
+
+    Returns
+    -------
+    concurrent.futures.ProcessPoolExecutor or contextlib.nullcontext
+        The process pool, or a context yielding None if the data must be read in
+        the current process.
+
+    Notes
+    -----
+    The workers are spawned instead of forked, as the HDF5 library state of the
+    parent process cannot be safely shared with its children. Spawned workers
+    import the calling script again, so it needs an `if __name__ == "__main__"`
+    guard when max_workers is greater than 1.
+    """
+    if max_workers is None or max_workers <= 1:
+        return nullcontext()
+
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(h5f.filename,),
+    )
+
+
+def _load_measurement(data_type, x, y):
+    """
+    Reads the measurement data of one position in a worker process.
+
+    Parameters
+    ----------
+    data_type : str
+        Type of measurement data to read. Can be "EDX", "MOKE" or "XRD".
+    x : float
+        The x position of the measurement.
+    y : float
+        The y position of the measurement.
+
+    Returns
+    -------
+    tuple
+        The measurement data and units, as returned by search_measurement_data_from_type.
+    """
+    return search_measurement_data_from_type(_worker_h5f, data_type, x, y)
+
+
+def _read_xrd_image(h5f, x, y):
+    """
+    Reads the XRD camera image of one position.
+
+    Parameters
+    ----------
+    h5f : h5py.File
+        The opened HDF5 file.
+    x : float
+        The x position of the measurement.
+    y : float
+        The y position of the measurement.
+
+    Returns
+    -------
+    numpy.ndarray
+        The 2D camera image.
+    """
+    group_path = make_group_path(
+        h5f, x_pos=x, y_pos=y, data_type="XRD", measurement_type="Image"
+    )
+    return get_xrd_image(h5f, group_path)["2D_Camera_Image"]
+
+
+def _load_xrd_image(x, y):
+    """
+    Reads the XRD camera image of one position in a worker process.
+
+    Parameters
+    ----------
+    x : float
+        The x position of the measurement.
+    y : float
+        The y position of the measurement.
+
+    Returns
+    -------
+    numpy.ndarray
+        The 2D camera image.
+    """
+    return _read_xrd_image(_worker_h5f, x, y)
+
+
+def get_measurement_data(
+    hdf5_file, data_type, exclude_wafer_edges=True, max_workers=None
+):
     """
     Reads the measurement data from an HDF5 file and returns an xarray DataTree object containing all the scans of every experiment.
 
     Parameters
     ----------
-    hdf5_file : str or Path
+    hdf5_file : str, pathlib.Path or h5py.File
         The path to the HDF5 file to read the data from.
     data_type : str
         The type of data to read. Must be one of 'EDX', 'MOKE', 'XRD' or 'all'.
     exclude_wafer_edges : bool, optional
         If True, the function will exclude the data measured at the edges of the wafer from the returned DataTree. Defaults to True.
+    max_workers : int, optional
+        The number of processes used to read the positions. If None or 1, the positions are read in the current process. Larger values need the calling script to be protected by an `if __name__ == "__main__"` guard.
 
     Returns
     -------
@@ -459,42 +836,66 @@ def get_measurement_data(hdf5_file, data_type, exclude_wafer_edges=True):
     dataset_moke = xr.Dataset()
     dataset_xrd = xr.Dataset()
 
-    for data_type in datatypes:
-        positions = get_all_positions(hdf5_file, data_type=data_type)
-        x_vals = sorted(set([pos[0] for pos in positions]))
-        y_vals = sorted(set([pos[1] for pos in positions]))
-
-        # Add measurement data
-        for x, y in positions:
-            if np.abs(x) + np.abs(y) > 60 and exclude_wafer_edges:
-                continue
-            measurement, units = search_measurement_data_from_type(
-                hdf5_file, data_type, x, y
+    with open_hdf5(hdf5_file) as h5f, _reading_pool(h5f, max_workers) as executor:
+        for data_type in datatypes:
+            positions, position_units = get_all_positions(
+                h5f, data_type=data_type, return_units=True
             )
+            x_vals = sorted(set([pos[0] for pos in positions]))
+            y_vals = sorted(set([pos[1] for pos in positions]))
+            x_index = {x: i for i, x in enumerate(x_vals)}
+            y_index = {y: i for i, y in enumerate(y_vals)}
+            measurement_arrays = {}
+
+            if exclude_wafer_edges:
+                positions = _remove_wafer_edges(
+                    positions, max_distance=60, strict=False
+                )
+
+            # Positions are read in parallel if a pool is used, then added to the
+            # arrays in order
+            if executor is None:
+                results = (
+                    search_measurement_data_from_type(h5f, data_type, x, y)
+                    for x, y in positions
+                )
+            else:
+                results = executor.map(
+                    _load_measurement,
+                    [data_type] * len(positions),
+                    [x for x, _ in positions],
+                    [y for _, y in positions],
+                    chunksize=16,
+                )
+            for (x, y), (measurement, units) in zip(positions, results):
+                add_measurement_data(
+                    measurement_arrays, measurement, x, y, x_index, y_index
+                )
+
             current_dataset = get_current_dataset(
                 data_type, dataset_edx, dataset_moke, dataset_xrd
             )
-            add_measurement_data(
-                current_dataset, measurement, data_type, x, y, x_vals, y_vals
-            )
+            for key, (scan_values, array) in measurement_arrays.items():
+                current_dataset[key] = xr.DataArray(
+                    array, coords=[y_vals, x_vals, scan_values], dims=["y", "x", key]
+                )
 
-        # Add units for x, y positions for all datasets
-        position_units = get_position_units(hdf5_file, data_type=data_type)
-        current_dataset["x"].attrs["units"] = position_units["x_pos"]
-        current_dataset["y"].attrs["units"] = position_units["y_pos"]
-
-        # Add units for scan axis in all datasets
-        for key in units.keys():
-            if data_type.lower() != "moke":
-                if key in current_dataset:
-                    current_dataset[key].attrs["units"] = units[key]
-            # else:
-            #     if (
-            #         key in current_dataset["index_value"]
-            #         and "units" not in current_dataset["Loops"].attrs
-            #     ):
-            #         print(units[key])
-            #         current_dataset["Loops"].attrs["units"] = units
+            # Add units for x, y positions for all datasets
+            current_dataset["x"].attrs["units"] = position_units["x_pos"]
+            current_dataset["y"].attrs["units"] = position_units["y_pos"]
+
+            # Add units for scan axis in all datasets
+            for key in units.keys():
+                if data_type.lower() != "moke":
+                    if key in current_dataset:
+                        current_dataset[key].attrs["units"] = units[key]
+                # else:
+                #     if (
+                #         key in current_dataset["index_value"]
+                #         and "units" not in current_dataset["Loops"].attrs
+                #     ):
+                #         print(units[key])
+                #         current_dataset["Loops"].attrs["units"] = units
 
     # Add datasets to the xarray DataTree
     measurement_tree["EDX"] = dataset_edx
@@ -504,228 +905,522 @@ def get_measurement_data(hdf5_file, data_type, exclude_wafer_edges=True):
     return measurement_tree
 
 
-def get_xrd_images(hdf5_file, exclude_wafer_edges=True):
+def get_xrd_images(hdf5_file, exclude_wafer_edges=True, max_workers=None):
+    """
+    Reads the XRD camera images of every position from an HDF5 file.
+
+    Parameters
+    ----------
+    hdf5_file : str, pathlib.Path or h5py.File
+        The path to the HDF5 file to read the data from.
+    exclude_wafer_edges : bool, optional
+        If True, the images measured at the edges of the wafer are not read. Defaults to True.
+    max_workers : int, optional
+        The number of processes used to read the images. If None or 1, the images are read in the current process. Larger values need the calling script to be protected by an `if __name__ == "__main__"` guard.
+
+    Returns
+    -------
+    xarray.Dataset
+        A Dataset with an "image" variable of dimensions (y, x, pixel x, pixel y), empty if there is no position to read.
+    """
     dataset = xr.Dataset()
 
-    positions = _get_all_positions(hdf5_file, data_type="xrd")
-    x_vals = sorted(set([pos[0] for pos in positions]))
-    y_vals = sorted(set([pos[1] for pos in positions]))
+    with open_hdf5(hdf5_file) as h5f:
+        positions = get_all_positions(h5f, data_type="XRD")
+        x_vals = sorted(set([pos[0] for pos in positions]))
+        y_vals = sorted(set([pos[1] for pos in positions]))
+        x_index = {x: i for i, x in enumerate(x_vals)}
+        y_index = {y: i for i, y in enumerate(y_vals)}
 
-    for x, y, nb_scan in tqdm(positions):
-        if np.abs(x) + np.abs(y) > 60 and exclude_wafer_edges:
-            continue
+        if exclude_wafer_edges:
+            positions = _remove_wafer_edges(positions, max_distance=60, strict=False)
+        if len(positions) == 0:
+            return dataset
 
-        group_path = make_group_path(["XRD", nb_scan, "image"])
-        image = get_xrd_image(hdf5_file, group_path)["2D_Camera_Image"]
-
-        if "image" not in dataset:
-            dataset["image"] = xr.DataArray(
-                np.nan,
-                coords=[
-                    y_vals,
-                    x_vals,
-                    np.arange(image.shape[0]),
-                    np.arange(image.shape[1]),
-                ],
-                dims=["y", "x", "pixel x", "pixel y"],
-            )
-        dataset["image"].loc[{"y": y, "x": x}] = image
+        # Reading the shape of the first image to allocate all the images at once
+        group_path = make_group_path(
+            h5f,
+            x_pos=positions[0][0],
+            y_pos=positions[0][1],
+            data_type="XRD",
+            measurement_type="Image",
+        )
+        first_image = h5f[group_path]["2D_Camera_Image"]
+        images = np.full(
+            (len(y_vals), len(x_vals), *first_image.shape),
+            np.nan,
+            dtype=np.promote_types(first_image.dtype, np.float32),
+        )
+
+        with _reading_pool(h5f, max_workers) as executor:
+            if executor is None:
+                results = (_read_xrd_image(h5f, x, y) for x, y in positions)
+            else:
+                results = executor.map(
+                    _load_xrd_image,
+                    [x for x, _ in positions],
+                    [y for _, y in positions],
+                )
+            for (x, y), image in zip(tqdm(positions), results):
+                images[y_index[y], x_index[x]] = image
+
+    dataset["image"] = xr.DataArray(
+        images,
+        coords=[
+            y_vals,
+            x_vals,
+            np.arange(images.shape[2]),
+            np.arange(images.shape[3]),
+        ],
+        dims=["y", "x", "pixel x", "pixel y"],
+    )
 
     return dataset
 
 
-def create_simplified_dataset(hdf5_file, hdf5_save_file):
-    group_list = ["edx", "moke", "xrd"]
-    coord_list = [
-        "({:.1f},{:.1f})".format(float(x), float(y))
-        for x in range(-40, 45, 5)
-        for y in range(-40, 45, 5)
-    ]
+def _to_zarr_attr(value):
+    """
+    Converts an HDF5 attribute value to a JSON serializable Zarr attribute.
 
-    with h5py.File(hdf5_file, "r") as h5f, h5py.File(hdf5_save_file, "w") as h5f_save:
+    Parameters
+    ----------
+    value : Any
+        The attribute value read with h5py.
 
-        for group in h5f["./"]:
-            try:
-                datatype = h5f[f"{group}"].attrs["HT_type"]
-            except KeyError:
-                continue
+    Returns
+    -------
+    Any
+        The value as a str, a Python number or a list.
+    """
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    if isinstance(value, np.ndarray):
+        return [_to_zarr_attr(item) for item in value.tolist()]
+    if isinstance(value, np.generic):
+        return _to_zarr_attr(value.item())
+
+    return value
 
-            if datatype in group_list:
-                print(f"Datatype: {datatype}")
-                for coord in coord_list:
-                    # Check if the group already exists
-                    saved_group_coord = f"{group}/{coord}"
 
-                    if coord not in h5f_save:
-                        try:
-                            instrument = h5f[f"{saved_group_coord}"]["instrument"]
-                        except KeyError:
-                            continue
+def _create_dataset(node, name, data, attrs=None):
+    """
+    Creates a dataset in an HDF5 group or an array in a Zarr group.
 
-                        h5f_save.create_group(f"{coord}")
+    Parameters
+    ----------
+    node : h5py.Group or zarr.Group
+        The group where the dataset is created.
+    name : str
+        The name of the dataset.
+    data : Any
+        The data of the dataset.
+    attrs : dict, optional
+        The attributes of the dataset.
+
+    Notes
+    -----
+    Strings are saved in Zarr with its variable-length string type, which unlike the
+    fixed-length NumPy string types has a Zarr v3 specification. Attributes are
+    converted to JSON serializable values in Zarr.
+    """
+    attrs = attrs or {}
+
+    if isinstance(node, h5py.Group):
+        dataset = node.create_dataset(name, data=data)
+        for key, value in attrs.items():
+            dataset.attrs[key] = value
+        return None
+
+    # The attributes are given at creation, each later update rewrites the metadata
+    attrs = {key: _to_zarr_attr(value) for key, value in attrs.items()}
+    data = np.asarray(data)
+    if data.dtype.kind in "SUO":
+        strings = np.empty(data.shape, dtype=object)
+        strings.ravel()[:] = [_to_zarr_attr(item) for item in data.ravel().tolist()]
+        array = node.create_array(name, shape=data.shape, dtype=str, attributes=attrs)
+        array[...] = strings
+    else:
+        node.create_array(name, data=data, attributes=attrs)
+
+    return None
+
+
+def _copy_dataset(source, node, name=None, attrs=None):
+    """
+    Copies a dataset, with its attributes, into an HDF5 or a Zarr group.
 
-                        # Create x and y position datasets
-                        h5f_save[f"{coord}"].create_dataset(
-                            "x_pos", data=instrument["x_pos"]
+    Parameters
+    ----------
+    source : h5py.Dataset
+        The dataset to copy.
+    node : h5py.Group or zarr.Group
+        The group where the dataset is copied.
+    name : str, optional
+        The name of the copied dataset. If None, the name of the source dataset is used.
+    attrs : dict, optional
+        Attributes added to the copied dataset, or replacing those of the source.
+    """
+    if name is None:
+        name = source.name.split("/")[-1]
+
+    if isinstance(node, h5py.Group):
+        source.file.copy(source, node, name=name)
+        for key, value in (attrs or {}).items():
+            node[name].attrs[key] = value
+    else:
+        _create_dataset(node, name, source[()], {**source.attrs, **(attrs or {})})
+
+    return None
+
+
+def _copy_array_dataset(source, node, name=None, attrs=None):
+    """
+    Copies an array dataset into a group, compressing it if it is stored uncompressed.
+
+    Parameters
+    ----------
+    source : h5py.Dataset
+        The dataset to copy.
+    node : h5py.Group or zarr.Group
+        The group where the dataset is copied.
+    name : str, optional
+        The name of the copied dataset. If None, the name of the source dataset is used.
+    attrs : dict, optional
+        Attributes added to the copied dataset, or replacing those of the source.
+
+    Notes
+    -----
+    In HDF5, datasets already compressed are copied as is, the others are written with
+    chunks of about 1 MiB and LZF compression. Zarr arrays use the default chunks and
+    compression of Zarr. Attributes are copied in all cases.
+    """
+    if name is None:
+        name = source.name.split("/")[-1]
+
+    if (
+        not isinstance(node, h5py.Group)
+        or source.compression is not None
+        or source.size == 0
+        or source.shape == ()
+    ):
+        _copy_dataset(source, node, name=name, attrs=attrs)
+        return None
+
+    dataset = node.create_dataset(
+        name,
+        data=source[()],
+        chunks=pick_chunks(source.shape, source.dtype.itemsize),
+        compression="lzf",
+        shuffle=True,
+    )
+    for key, value in {**source.attrs, **(attrs or {})}.items():
+        dataset.attrs[key] = value
+
+    return None
+
+
+def _index_position_groups(h5f):
+    """
+    Indexes the position groups of the data types saved in the simplified dataset.
+
+    Parameters
+    ----------
+    h5f : h5py.File
+        The HDF5 file to read the data from.
+
+    Returns
+    -------
+    datatypes : list of str
+        The data types found in the file, in the order of the file.
+    position_index : dict
+        The position groups, with (data type, position name) keys, so that missing
+        positions are simple lookups instead of raised KeyErrors.
+    """
+    datatypes = []
+    position_index = {}
+    for group_obj in h5f.values():
+        datatype = group_obj.attrs.get("HT_type")
+        if datatype in ["edx", "moke", "xrd"] and datatype not in datatypes:
+            datatypes.append(datatype)
+            for coord, position_group in group_obj.items():
+                position_index[(datatype, coord)] = position_group
+
+    return datatypes, position_index
+
+
+def _write_simplified_position(h5f, save_root, coord, datatypes, position_index):
+    """
+    Writes the simplified data of one position to an HDF5 or a Zarr group.
+
+    Parameters
+    ----------
+    h5f : h5py.File
+        The HDF5 file to read the data from.
+    save_root : h5py.Group or zarr.Group
+        The root group of the simplified dataset, where the position group is created.
+    coord : str
+        The name of the position group, e.g. "(0.0,0.0)".
+    datatypes : list of str
+        The data types to write, as returned by _index_position_groups.
+    position_index : dict
+        The position groups of the file, as returned by _index_position_groups.
+
+    Notes
+    -----
+    The position group is created by the first data type measured at this position,
+    the missing data of the following data types are then saved as NaN.
+    """
+    node = None
+
+    for datatype in datatypes:
+        position_group = position_index.get((datatype, coord))
+        reference_group = position_index.get((datatype, "(0.0,0.0)"))
+
+        # Check if the group already exists
+        if node is None:
+            if position_group is None or "instrument" not in position_group:
+                continue
+            instrument = position_group["instrument"]
+
+            node = save_root.create_group(coord)
+
+            # Copy x and y position datasets (with their units)
+            _copy_dataset(instrument["x_pos"], node, attrs={"HT_type": "position"})
+            _copy_dataset(instrument["y_pos"], node, attrs={"HT_type": "position"})
+
+        if position_group is None:
+            # Giving NaN values for missing data
+            results = reference_group["results"]
+            # If EDX (but should never happened)
+            if datatype == "edx":
+                for key in results.keys():
+                    if "Element" in key:
+                        print(key)
+                        _create_dataset(
+                            node,
+                            key.split(" ")[-1],
+                            np.nan,
+                            {"units": "at.%", "HT_type": datatype},
                         )
-                        h5f_save[f"{coord}"].create_dataset(
-                            "y_pos", data=instrument["y_pos"]
+            # If MOKE
+            elif datatype == "moke":
+                for key in results.keys():
+                    if key == "coercivity_m0":
+                        _create_dataset(
+                            node,
+                            key,
+                            np.nan,
+                            {"units": "Tesla (T)", "HT_type": datatype},
                         )
-                        h5f_save[f"{coord}"]["x_pos"].attrs["units"] = instrument[
-                            "x_pos"
-                        ].attrs["units"]
-                        h5f_save[f"{coord}"]["y_pos"].attrs["units"] = instrument[
-                            "y_pos"
-                        ].attrs["units"]
-                        h5f_save[f"{coord}"]["x_pos"].attrs["HT_type"] = "position"
-                        h5f_save[f"{coord}"]["y_pos"].attrs["HT_type"] = "position"
-
-                    if coord not in h5f[f"{group}"].keys():
-                        # Giving NaN values for missing data
-                        node = h5f_save[f"{coord}"]
-                        results = h5f[f"{group}/(0.0,0.0)"]["results"]
-                        # If EDX (but should never happened)
-                        if datatype == "edx":
-                            for key in results.keys():
-                                if "Element" in key:
-                                    print(key)
-                                    node.create_dataset(key.split(" ")[-1], data=np.nan)
-                                    node[key.split(" ")[-1]].attrs["units"] = "at.%"
-                                    node[key.split(" ")[-1]].attrs["HT_type"] = datatype
-                        # If MOKE
-                        elif datatype == "moke":
-                            for key in results.keys():
-                                if key == "coercivity_m0":
-                                    node.create_dataset(key, data=np.nan)
-                                    node[key.split(" ")[-1]].attrs[
-                                        "units"
-                                    ] = "Tesla (T)"
-                                    node[key.split(" ")[-1]].attrs["HT_type"] = datatype
-                                elif key == "max_kerr_rotation":
-                                    pass
-                                    """node.create_dataset(key, data=np.nan)
-                                    node[key.split(" ")[-1]].attrs["HT_type"] = datatype"""
-
-                        # If XRD
-                        elif datatype == "xrd":
-                            saving_result_list = ["A", "B", "C", "phase_fraction"]
-
-                            for phase in results["phases"].keys():
-                                for saving_key in saving_result_list:
-                                    if saving_key in results["phases"][phase].keys():
-                                        node.create_dataset(
-                                            f"{phase}_{saving_key}", data=np.nan
-                                        )
-                        continue
+                    elif key == "max_kerr_rotation":
+                        pass
+                        """node.create_dataset(key, data=np.nan)
+                        node[key.split(" ")[-1]].attrs["HT_type"] = datatype"""
+
+            # If XRD
+            elif datatype == "xrd":
+                for phase in results["phases"].keys():
+                    for saving_key, _ in _XRD_FIELDS:
+                        if saving_key in results["phases"][phase].keys():
+                            _create_dataset(node, f"{phase}_{saving_key}", np.nan)
+            continue
 
-                    # Creates new dataset with current datatype
-                    if datatype == "edx":
-                        node = h5f_save[f"{coord}"]
-                        results = h5f[f"{group}/{coord}"]["results"]
-                        for key in results.keys():
-                            if "Element" in key:
-                                try:
-                                    node.create_dataset(
-                                        key.split(" ")[-1],
-                                        data=results[key]["AtomPercent"][()],
-                                    )
-                                    node[key.split(" ")[-1]].attrs["units"] = results[
-                                        key
-                                    ]["AtomPercent"].attrs["units"]
-                                    node[key.split(" ")[-1]].attrs["HT_type"] = datatype
-                                except KeyError:
-                                    reference_results = h5f[f"{group}/(0.0,0.0)"][
-                                        "results"
-                                    ]
-                                    if (
-                                        key in reference_results.keys()
-                                        and "AtomPercent"
-                                        in reference_results[key].keys()
-                                    ):
-                                        node.create_dataset(
-                                            key.split(" ")[-1],
-                                            data=np.nan,
-                                        )
-                                        node[key.split(" ")[-1]].attrs["units"] = (
-                                            reference_results[key]["AtomPercent"].attrs[
-                                                "units"
-                                            ]
-                                        )
-                                        node[key.split(" ")[-1]].attrs[
-                                            "HT_type"
-                                        ] = datatype
-
-                    elif datatype == "moke":
-                        node = h5f_save[f"{coord}"]
-                        results = h5f[f"{group}/{coord}"]["results"]
-                        for key in results.keys():
-                            if key == "coercivity_m0":
-                                node.create_dataset(
-                                    key,
-                                    data=results[key]["mean"][()],
-                                )
-                                node[key].attrs["units"] = "Tesla (T)"
-                                node[key].attrs["HT_type"] = datatype
-                            elif key == "max_kerr_rotation":
-                                pass
-                                """ node.create_dataset(
-                                    key,
-                                    data=results[key][()],
-                                )
-                                node[key].attrs["units"] = "Degrees (°)"
-                                node[key].attrs["HT_type"] = datatype """
-
-                    elif datatype == "xrd":
-                        saving_result_list = ["A", "B", "C", "phase_fraction"]
-                        node = h5f_save[f"{coord}"]
-                        results = h5f[f"{group}/{coord}"]["results/phases"]
-                        measurement = h5f[f"{group}/{coord}"]["measurement"]
-
-                        # Fetching the results
-                        for phase in results.keys():
-                            for result in saving_result_list:
-                                if result in results[phase].keys():
-
-                                    node.create_dataset(
-                                        f"{phase}_{result}",
-                                        data=(
-                                            str(results[phase][result][()])
-                                            .strip()
-                                            .split("+-")[0]
-                                        ),
-                                    )
-                                    try:
-                                        node[f"{phase}_{result}"].attrs["units"] = (
-                                            results[phase][result].attrs["units"]
-                                        )
-                                        node[f"{phase}_{result}"].attrs[
-                                            "HT_type"
-                                        ] = datatype
-                                    except KeyError:
-                                        # Taking into account missing attributes
-                                        pass
-
-                        # Fetching integrated intensity
-                        node.create_dataset(
-                            "CdTe_integrate_intensity",
-                            data=measurement["CdTe_integrate/intensity"][()],
+        # Creates new dataset with current datatype
+        if datatype == "edx":
+            results = position_group["results"]
+            for key in results.keys():
+                if "Element" in key:
+                    if "AtomPercent" in results[key]:
+                        _copy_dataset(
+                            results[key]["AtomPercent"],
+                            node,
+                            name=key.split(" ")[-1],
+                            attrs={"HT_type": datatype},
                         )
-                        node["CdTe_integrate_intensity"].attrs[
-                            "units"
-                        ] = "arbitrary unit (a.u.)"
-                        node["CdTe_integrate_intensity"].attrs["HT_type"] = datatype
-
-                        # Fetching integrated q
-                        node.create_dataset(
-                            "CdTe_integrate_q",
-                            data=measurement["CdTe_integrate/q"][()],
+                        continue
+
+                    reference_results = reference_group["results"]
+                    if (
+                        key in reference_results.keys()
+                        and "AtomPercent" in reference_results[key].keys()
+                    ):
+                        _create_dataset(
+                            node,
+                            key.split(" ")[-1],
+                            np.nan,
+                            {
+                                "units": reference_results[key]["AtomPercent"].attrs[
+                                    "units"
+                                ],
+                                "HT_type": datatype,
+                            },
                         )
-                        node["CdTe_integrate_q"].attrs["units"] = "Angstrom^-1 (A^-1)"
-                        node["CdTe_integrate_q"].attrs["HT_type"] = datatype
 
-                        # Fetching CdTe image
-                        node.create_dataset(
-                            "CdTe",
-                            data=measurement["CdTe"][()],
+        elif datatype == "moke":
+            results = position_group["results"]
+            for key in results.keys():
+                if key == "coercivity_m0":
+                    _copy_dataset(
+                        results[key]["mean"],
+                        node,
+                        name=key,
+                        attrs={"units": "Tesla (T)", "HT_type": datatype},
+                    )
+                elif key == "max_kerr_rotation":
+                    pass
+                    """ node.create_dataset(
+                        key,
+                        data=results[key][()],
+                    )
+                    node[key].attrs["units"] = "Degrees (°)"
+                    node[key].attrs["HT_type"] = datatype """
+
+        elif datatype == "xrd":
+            results = position_group["results/phases"]
+            measurement = position_group["measurement"]
+
+            # Fetching the results
+            for phase in results.keys():
+                for result, _ in _XRD_FIELDS:
+                    if result in results[phase].keys():
+                        source = results[phase][result]
+                        # Taking into account missing attributes
+                        attrs = None
+                        if "units" in source.attrs:
+                            attrs = {
+                                "units": source.attrs["units"],
+                                "HT_type": datatype,
+                            }
+
+                        _create_dataset(
+                            node,
+                            f"{phase}_{result}",
+                            str(source[()]).strip().split("+-")[0],
+                            attrs,
                         )
-                        node["CdTe"].attrs["HT_type"] = datatype
+
+            # Fetching integrated intensity
+            _copy_array_dataset(
+                measurement["CdTe_integrate/intensity"],
+                node,
+                name="CdTe_integrate_intensity",
+                attrs={"units": "arbitrary unit (a.u.)", "HT_type": datatype},
+            )
+
+            # Fetching integrated q
+            _copy_array_dataset(
+                measurement["CdTe_integrate/q"],
+                node,
+                name="CdTe_integrate_q",
+                attrs={"units": "Angstrom^-1 (A^-1)", "HT_type": datatype},
+            )
+
+            # Fetching CdTe image
+            _copy_array_dataset(measurement["CdTe"], node, attrs={"HT_type": datatype})
+
+    return None
+
+
+def _write_zarr_position(zarr_save_file, coord):
+    """
+    Writes the simplified data of one position to a Zarr store in a worker process.
+
+    Parameters
+    ----------
+    zarr_save_file : str or pathlib.Path
+        The path to the Zarr store, which must already exist.
+    coord : str
+        The name of the position group, e.g. "(0.0,0.0)".
+    """
+    global _worker_position_index
+
+    import zarr
+
+    # The position groups are indexed once per worker
+    if _worker_position_index is None:
+        _worker_position_index = _index_position_groups(_worker_h5f)
+    datatypes, position_index = _worker_position_index
+
+    save_root = zarr.open_group(zarr_save_file, mode="a")
+    _write_simplified_position(_worker_h5f, save_root, coord, datatypes, position_index)
+
+    return None
+
+
+def create_simplified_dataset(
+    hdf5_file, hdf5_save_file, backend="hdf5", max_workers=None
+):
+    """
+    Saves the main results of an HDF5 file (EDX compositions, MOKE coercivity and
+    XRD phases and patterns) in a simplified file with one group per position.
+
+    Parameters
+    ----------
+    hdf5_file : str or pathlib.Path
+        The path to the HDF5 file to read the data from.
+    hdf5_save_file : str or pathlib.Path
+        The path to the simplified file to create.
+    backend : str, default="hdf5"
+        The format of the simplified file, either "hdf5" or "zarr". The "zarr"
+        backend requires the optional zarr package (version 3 or later).
+    max_workers : int, optional
+        The number of processes writing the positions to the Zarr store. If None or
+        1, the positions are written in the current process. Larger values need the
+        calling script to be protected by an `if __name__ == "__main__"` guard. Not
+        used by the "hdf5" backend.
+
+    Raises
+    ------
+    ValueError
+        If the backend is neither "hdf5" nor "zarr".
+
+    Notes
+    -----
+    With the "zarr" backend, each position group is written directly to the Zarr
+    store by a pool of processes, as Zarr supports concurrent writes to different
+    groups.
+    """
+    if backend not in ("hdf5", "zarr"):
+        raise ValueError(f"Unknown backend '{backend}', expected 'hdf5' or 'zarr'.")
+
+    coord_list = [
+        "({:.1f},{:.1f})".format(float(x), float(y))
+        for x in range(-40, 45, 5)
+        for y in range(-40, 45, 5)
+    ]
+
+    with h5py.File(hdf5_file, "r", **FILE_OPTIONS) as h5f:
+        datatypes, position_index = _index_position_groups(h5f)
+        for datatype in datatypes:
+            print(f"Datatype: {datatype}")
+
+        if backend == "hdf5":
+            with h5py.File(
+                hdf5_save_file, "w", rdcc_nbytes=FILE_OPTIONS["rdcc_nbytes"]
+            ) as h5f_save:
+                for coord in coord_list:
+                    _write_simplified_position(
+                        h5f, h5f_save, coord, datatypes, position_index
+                    )
+
+            return None
+
+        import zarr
+
+        save_root = zarr.open_group(hdf5_save_file, mode="w")
+        with _reading_pool(h5f, max_workers) as executor:
+            if executor is None:
+                for coord in coord_list:
+                    _write_simplified_position(
+                        h5f, save_root, coord, datatypes, position_index
+                    )
+            else:
+                list(
+                    executor.map(
+                        _write_zarr_position,
+                        [hdf5_save_file] * len(coord_list),
+                        coord_list,
+                    )
+                )
+
+    return None
@@ -6,6 +6,7 @@ Functions to read MOKE data from HDF5 files
 """
 import h5py
 import numpy as np
+from packages.readers.hdf5_utils import open_hdf5
 
 
 def get_moke_results(hdf5_file, group_path, result_type=None):
@@ -14,7 +15,7 @@ def get_moke_results(hdf5_file, group_path, result_type=None):
 
     Parameters
     ----------
-    hdf5_file : str or pathlib.Path
+    hdf5_file : str, pathlib.Path or h5py.File
         The path to the HDF5 file containing the data to be extracted.
     group_path : str or pathlib.Path
         The path within the HDF5 file to the group where the data is located.
@@ -32,7 +33,7 @@ def get_moke_results(hdf5_file, group_path, result_type=None):
     units_results_moke = {}
 
     try:
-        with h5py.File(hdf5_file, "r") as h5f:
+        with open_hdf5(hdf5_file) as h5f:
             node = h5f[group_path]
             for key in node.keys():
                 if isinstance(node[key], h5py.Group) and key != "parameters":
@@ -70,7 +71,7 @@ def get_moke_loop(hdf5_file, group_path):
 
     Parameters
     ----------
-    hdf5_file : str or pathlib.Path
+    hdf5_file : str, pathlib.Path or h5py.File
         The path to the HDF5 file to read the data from.
     group_path : str or pathlib.Path
         The path within the HDF5 file to the group containing the MOKE loop data.
@@ -86,7 +87,7 @@ def get_moke_loop(hdf5_file, group_path):
     measurement = {}
     measurement_units = {}
     try:
-        with h5py.File(hdf5_file, "r") as h5f:
+        with open_hdf5(hdf5_file) as h5f:
             node = h5f[group_path]["shot_mean"]
             for key in node.keys():
                 measurement[key.replace("_mean", "")] = node[key][()]
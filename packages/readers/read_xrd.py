@@ -5,6 +5,7 @@ Functions to read XRD data from HDF5 files
 @author: williamrigaut
 """
 import h5py
+from packages.readers.hdf5_utils import open_hdf5
 
 
 def _get_attrs(name, obj):
@@ -41,7 +42,7 @@ def get_xrd_results(hdf5_file, group_path, result_type):
 
     Parameters
     ----------
-    hdf5_file : str or pathlib.Path
+    hdf5_file : str, pathlib.Path or h5py.File
         The path to the HDF5 file containing the data to be extracted.
     group_path : str or pathlib.Path
         The path within the HDF5 file to the group where the data is located.
@@ -69,7 +70,7 @@ def get_xrd_results(hdf5_file, group_path, result_type):
     xrd_units = {}
 
     try:
-        with h5py.File(hdf5_file, "r") as h5f:
+        with open_hdf5(hdf5_file) as h5f:
             result_types = h5f[group_path].keys()
             for result in result_types:
                 if result_type.lower() in result:
@@ -95,7 +96,7 @@ def get_xrd_pattern(hdf5_file, group_path):
 
     Parameters
     ----------
-    hdf5_file : str or pathlib.Path
+    hdf5_file : str, pathlib.Path or h5py.File
         The path to the HDF5 file containing the data to be extracted.
     group_path : str or pathlib.Path
         The path within the HDF5 file to the group containing the XRD pattern data.
@@ -115,7 +116,7 @@ def get_xrd_pattern(hdf5_file, group_path):
     measurement = {}
     measurement_units = {}
     try:
-        with h5py.File(hdf5_file, "r") as h5f:
+        with open_hdf5(hdf5_file) as h5f:
             # Getting counts and angle datasets (with corresponding units)
             node = h5f[group_path]
             for key in node.keys():
@@ -137,7 +138,7 @@ def get_xrd_image(hdf5_file, group_path):
     image = {}
 
     try:
-        with h5py.File(hdf5_file, "r") as h5f:
+        with open_hdf5(hdf5_file) as h5f:
             image["2D_Camera_Image"] = h5f[group_path]["2D_Camera_Image"][()]
 
     except KeyError: